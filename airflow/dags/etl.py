@@ -1,7 +1,10 @@
-import json
+import multiprocessing
 import os
 import re
 import pandas as pd
+from contextlib import closing, nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import timedelta, datetime
 from airflow.decorators import dag, task
 from airflow.providers.sqlite.hooks.sqlite import SqliteHook
@@ -59,131 +62,215 @@ TABLE_CREATION_QUERIES = [
     )"""
 ]
 
+# AUTOINCREMENT never reuses ids, so new jobs continue after the highest id ever issued, not the highest one left.
+LAST_JOB_ID_QUERY = """SELECT MAX(
+    COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'job'), 0),
+    COALESCE((SELECT MAX(id) FROM job), 0)
+)"""
+
+# Secondary indexes are dropped while loading into an empty job table and rebuilt in one sorted pass
+# afterwards; loads into a populated table update them in place.
+SECONDARY_INDEXES = {
+    "idx_company_job_id": "company (job_id)",
+    "idx_education_job_id": "education (job_id)",
+    "idx_experience_job_id": "experience (job_id)",
+    "idx_salary_job_id": "salary (job_id)",
+    "idx_location_job_id": "location (job_id)",
+}
+
+# WAL relies on shared memory between processes, so the database must not live on a networked filesystem.
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "cache_size=-131072",
+    "mmap_size=268435456",
+)
+
+def apply_pragmas(cur):
+    for pragma in SQLITE_PRAGMAS:
+        cur.execute(f"PRAGMA {pragma}")
+
 @task()
 def create_tables():
     sqlite_hook = SqliteHook(sqlite_conn_id='sqlite_default')
-    for query in TABLE_CREATION_QUERIES:
-        sqlite_hook.run(query)
+    with closing(sqlite_hook.get_conn()) as conn:
+        cur = conn.cursor()
+        apply_pragmas(cur)
+        with conn:
+            for query in TABLE_CREATION_QUERIES:
+                cur.execute(query)
+
+SOURCE_FILE_PATH = 'source/jobs.csv'
+EXTRACTED_DIR = 'staging/extracted'
+TRANSFORMED_DIR = 'staging/transformed'
+
+_WS_RE = re.compile(r'\s+')
+
+# Rows held in memory at once; job contexts are several KB each.
+CSV_CHUNK_SIZE = 10_000
+
+# Rows per process when cleaning descriptions in parallel.
+TRANSFORM_SHARD_SIZE = 1000
+
+# Intermediate files are only written for debugging, set ETL_KEEP_STAGING=1 to enable them.
+KEEP_STAGING = os.getenv('ETL_KEEP_STAGING', '') == '1'
+
+# Static values of every transformed record; only the job description comes from the source.
+RECORD_TEMPLATE = {
+    "job": {
+        "title": "job_title",
+        "industry": "job_industry",
+        "description": None,
+        "employment_type": "job_employment_type",
+        "date_posted": "job_date_posted",
+    },
+    "company": {
+        "name": "company_name",
+        "link": "company_linkedin_link",
+    },
+    "education": {
+        "required_credential": "job_required_credential",
+    },
+    "experience": {
+        "months_of_experience": "job_months_of_experience",
+        "seniority_level": "seniority_level",
+    },
+    "salary": {
+        "currency": "salary_currency",
+        "min_value": "salary_min_value",
+        "max_value": "salary_max_value",
+        "unit": "salary_unit",
+    },
+    "location": {
+        "country": "country",
+        "locality": "locality",
+        "region": "region",
+        "postal_code": "postal_code",
+        "street_address": "street_address",
+        "latitude": "latitude",
+        "longitude": "longitude",
+    },
+}
+
+# Every job gets one row per child table; these values are copied by SQLite from the inserted jobs.
+CHILD_TABLE_VALUES = {table: fields for table, fields in RECORD_TEMPLATE.items() if table != "job"}
+
+TEMPLATE_COLUMNS = {
+    f"{section}_{field}": value for section, fields in RECORD_TEMPLATE.items() for field, value in fields.items()
+}
+
+def extract(reader):
+    for part, df in enumerate(reader):
+        df['context'] = df['context'].fillna('').astype(str)
+        if KEEP_STAGING:
+            os.makedirs(EXTRACTED_DIR, exist_ok=True)
+            df[['context']].to_parquet(os.path.join(EXTRACTED_DIR, f'jobs_{part}.parquet'))
+        yield part, df
+
+def clean_descriptions(contexts):
+    return contexts.str.strip().str.replace(_WS_RE, ' ', regex=True)
+
+def description_pool():
+    # Workers are forked so they inherit this module: Airflow imports DAG files under a generated name that
+    # spawn or forkserver children cannot re-import. Daemonic processes, such as Celery prefork workers,
+    # may not have children at all, so they clean serially.
+    workers = os.cpu_count() or 1
+    if workers == 1 or multiprocessing.current_process().daemon:
+        return nullcontext()
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+
+def transform(df, part, executor=None):
+    contexts = df['context']
+    if executor is not None and len(contexts) > TRANSFORM_SHARD_SIZE:
+        shards = [contexts.iloc[i:i + TRANSFORM_SHARD_SIZE] for i in range(0, len(contexts), TRANSFORM_SHARD_SIZE)]
+        try:
+            descriptions = pd.concat(executor.map(clean_descriptions, shards))
+        except BrokenProcessPool:
+            descriptions = clean_descriptions(contexts)
+    else:
+        descriptions = clean_descriptions(contexts)
+    if KEEP_STAGING:
+        os.makedirs(TRANSFORMED_DIR, exist_ok=True)
+        pd.DataFrame(_transformed_columns(descriptions)).to_parquet(
+            os.path.join(TRANSFORMED_DIR, f'jobs_{part}.parquet'), compression='zstd'
+        )
+    return descriptions
+
+def _transformed_columns(descriptions):
+    return {**TEMPLATE_COLUMNS, "job_description": descriptions}
+
+# SQLite's default SQLITE_MAX_VARIABLE_NUMBER, the cap on bound parameters per statement.
+SQLITE_MAX_VARIABLES = 999
+
+def bulk_insert(cur, table, cols, rows, chunk=500):
+    chunk = min(chunk, SQLITE_MAX_VARIABLES // len(cols))
+    placeholder = "(" + ", ".join("?" * len(cols)) + ")"
+    for i in range(0, len(rows), chunk):
+        batch = rows[i:i + chunk]
+        sql = f"INSERT INTO {table} ({', '.join(cols)}) VALUES " + ", ".join([placeholder] * len(batch))
+        cur.execute(sql, [value for row in batch for value in row])
+
+def insert_jobs(cur, first_id, descriptions):
+    job_ids = range(first_id, first_id + len(descriptions))
+    job = RECORD_TEMPLATE["job"]
+    jobs = [
+        (job_id, job["title"], job["industry"], description, job["employment_type"], job["date_posted"])
+        for job_id, description in zip(job_ids, descriptions.to_numpy())
+    ]
+    bulk_insert(cur, "job", ("id", "title", "industry", "description", "employment_type", "date_posted"), jobs)
+
+def insert_child_rows(cur, first_id):
+    for table, values in CHILD_TABLE_VALUES.items():
+        cols = ", ".join(values)
+        placeholders = ", ".join("?" * len(values))
+        cur.execute(
+            f"INSERT INTO {table} (job_id, {cols}) SELECT id, {placeholders} FROM job WHERE id >= ? ORDER BY id",
+            (*values.values(), first_id)
+        )
+
+def load(description_chunks):
+    sqlite_hook = SqliteHook(sqlite_conn_id='sqlite_default')
+    loaded = 0
+    with closing(sqlite_hook.get_conn()) as conn:
+        cur = conn.cursor()
+        apply_pragmas(cur)
+        with conn:
+            cur.execute("BEGIN IMMEDIATE")
+            first_id = cur.execute(LAST_JOB_ID_QUERY).fetchone()[0] + 1
+            if cur.execute("SELECT NOT EXISTS (SELECT 1 FROM job)").fetchone()[0]:
+                for index_name in SECONDARY_INDEXES:
+                    cur.execute(f"DROP INDEX IF EXISTS {index_name}")
+            for descriptions in description_chunks:
+                insert_jobs(cur, first_id + loaded, descriptions)
+                loaded += len(descriptions)
+            insert_child_rows(cur, first_id)
+            for index_name, target in SECONDARY_INDEXES.items():
+                cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {target}")
+    return loaded
 
 @task()
-def extract():
-    source_file_path = 'source/jobs.csv'
-    extracted_dir = 'staging/extracted'
-    os.makedirs(extracted_dir, exist_ok=True)
+def extract_transform_load():
     try:
-        df = pd.read_csv(source_file_path)
+        reader = pd.read_csv(SOURCE_FILE_PATH, chunksize=CSV_CHUNK_SIZE)
     except FileNotFoundError:
-        print(f"Error: The source file '{source_file_path}' does not exist.")
+        print(f"Error: The source file '{SOURCE_FILE_PATH}' does not exist.")
         return
-    for index, row in df.iterrows():
-        context = row.get('context', '')
-        if not isinstance(context, str):
-            context = str(context)
-        file_path = os.path.join(extracted_dir, f"job_{index}.txt")
-        with open(file_path, 'w') as file:
-            file.write(context)
-    print(f"Extracted {len(df)} rows and saved as text files in {extracted_dir}")
-
-@task()
-def transform():
-    extracted_dir = 'staging/extracted'
-    transformed_dir = 'staging/transformed'
-    os.makedirs(transformed_dir, exist_ok=True)
-    for filename in os.listdir(extracted_dir):
-        if filename.endswith('.txt'):
-            file_path = os.path.join(extracted_dir, filename)
-            with open(file_path, 'r') as file:
-                context = file.read()
-            transformed_data = {
-                "job": {
-                    "title": "job_title",
-                    "industry": "job_industry",
-                    "description": clean_description(context),
-                    "employment_type": "job_employment_type",
-                    "date_posted": "job_date_posted",
-                },
-                "company": {
-                    "name": "company_name",
-                    "link": "company_linkedin_link",
-                },
-                "education": {
-                    "required_credential": "job_required_credential",
-                },
-                "experience": {
-                    "months_of_experience": "job_months_of_experience",
-                    "seniority_level": "seniority_level",
-                },
-                "salary": {
-                    "currency": "salary_currency",
-                    "min_value": "salary_min_value",
-                    "max_value": "salary_max_value",
-                    "unit": "salary_unit",
-                },
-                "location": {
-                    "country": "country",
-                    "locality": "locality",
-                    "region": "region",
-                    "postal_code": "postal_code",
-                    "street_address": "street_address",
-                    "latitude": "latitude",
-                    "longitude": "longitude",
-                },
-            }
-            transformed_file_path = os.path.join(transformed_dir, f"{filename.replace('.txt', '.json')}")
-            with open(transformed_file_path, 'w') as json_file:
-                json.dump(transformed_data, json_file)
-
-def clean_description(description):
-    return re.sub(r'\s+', ' ', description.strip())
+    with reader, description_pool() as executor:
+        loaded = load(transform(df, part, executor) for part, df in extract(reader))
+    print(f"Loaded {loaded} rows from {SOURCE_FILE_PATH} into the SQLite database")
 
 @task()
-def load():
+def finalize():
     sqlite_hook = SqliteHook(sqlite_conn_id='sqlite_default')
-    transformed_dir = 'staging/transformed'
-    for file_name in os.listdir(transformed_dir):
-        if file_name.endswith(".json"):
-            file_path = os.path.join(transformed_dir, file_name)
-            with open(file_path, 'r') as file:
-                transformed_data = json.load(file)
-            job_data = transformed_data['job']
-            company_data = transformed_data['company']
-            education_data = transformed_data['education']
-            experience_data = transformed_data['experience']
-            salary_data = transformed_data['salary']
-            location_data = transformed_data['location']
-            insert_job_query = """
-            INSERT INTO job (title, industry, description, employment_type, date_posted)
-            VALUES (:title, :industry, :description, :employment_type, :date_posted)
-            """
-            sqlite_hook.run(insert_job_query, parameters=job_data)
-            get_job_id_query = "SELECT last_insert_rowid()"
-            job_id = sqlite_hook.get_first(get_job_id_query)
-            insert_company_query = """
-            INSERT INTO company (job_id, name, link)
-            VALUES (:job_id, :name, :link)
-            """
-            sqlite_hook.run(insert_company_query, parameters={**company_data, "job_id": job_id})
-            insert_education_query = """
-            INSERT INTO education (job_id, required_credential)
-            VALUES (:job_id, :required_credential)
-            """
-            sqlite_hook.run(insert_education_query, parameters={**education_data, "job_id": job_id})
-            insert_experience_query = """
-            INSERT INTO experience (job_id, months_of_experience, seniority_level)
-            VALUES (:job_id, :months_of_experience, :seniority_level)
-            """
-            sqlite_hook.run(insert_experience_query, parameters={**experience_data, "job_id": job_id})
-            insert_salary_query = """
-            INSERT INTO salary (job_id, currency, min_value, max_value, unit)
-            VALUES (:job_id, :currency, :min_value, :max_value, :unit)
-            """
-            sqlite_hook.run(insert_salary_query, parameters={**salary_data, "job_id": job_id})
-            insert_location_query = """
-            INSERT INTO location (job_id, country, locality, region, postal_code, street_address, latitude, longitude)
-            VALUES (:job_id, :country, :locality, :region, :postal_code, :street_address, :latitude, :longitude)
-            """
-            sqlite_hook.run(insert_location_query, parameters={**location_data, "job_id": job_id})
-    print(f"Data loaded successfully into the SQLite database from {transformed_dir}")
+    with closing(sqlite_hook.get_conn()) as conn:
+        cur = conn.cursor()
+        with conn:
+            for index_name, target in SECONDARY_INDEXES.items():
+                cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {target}")
+        # Refresh sqlite_stat1 so the query planner has row counts for the freshly loaded tables.
+        cur.execute("ANALYZE")
+        cur.execute("PRAGMA optimize")
 
 DAG_DEFAULT_ARGS = {
     "depends_on_past": False,
@@ -202,6 +289,6 @@ DAG_DEFAULT_ARGS = {
 )
 def etl_dag():
     create_tables_task = create_tables()
-    create_tables_task >> extract() >> transform() >> load()
+    create_tables_task >> extract_transform_load() >> finalize()
 
 etl_dag()
@@ -0,0 +1,94 @@
+import re
+import sqlite3
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+import pytest
+
+from dags import etl
+
+TABLES = ("job", "company", "education", "experience", "salary", "location")
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = tmp_path / "etl.db"
+    monkeypatch.setattr(etl.SqliteHook, "get_conn", lambda self: sqlite3.connect(path))
+    etl.create_tables.function()
+    return path
+
+
+def test_bulk_insert_splits_batches_wider_than_variable_limit():
+    cols = ("a", "b", "c", "d", "e", "f", "g", "h")
+    rows = [tuple(range(i, i + len(cols))) for i in range(3 * (etl.SQLITE_MAX_VARIABLES // len(cols)) + 7)]
+    conn = sqlite3.connect(":memory:")
+    cur = conn.cursor()
+    cur.execute(f"CREATE TABLE wide ({', '.join(cols)})")
+
+    etl.bulk_insert(cur, "wide", cols, rows, chunk=1000)
+
+    assert cur.execute("SELECT COUNT(*) FROM wide").fetchone()[0] == len(rows)
+    assert cur.execute("SELECT * FROM wide ORDER BY a").fetchall() == rows
+    conn.close()
+
+
+CONTEXTS = pd.Series(["  lead\tand  trailing \n", "multi\n\nline\r\ntext", "", "single", "\u00a0nbsp\u2003em "])
+
+
+def test_clean_descriptions_matches_regex_sub():
+    expected = [re.sub(r'\s+', ' ', context.strip()) for context in CONTEXTS]
+    assert etl.clean_descriptions(CONTEXTS).tolist() == expected
+
+
+class BrokenExecutor:
+    def map(self, function, *iterables):
+        raise BrokenProcessPool("worker died")
+
+
+def test_transform_falls_back_to_serial_on_broken_pool(monkeypatch):
+    monkeypatch.setattr(etl, "TRANSFORM_SHARD_SIZE", 2)
+    df = pd.DataFrame({"context": CONTEXTS})
+    assert etl.transform(df, 0, executor=BrokenExecutor()).tolist() == etl.clean_descriptions(CONTEXTS).tolist()
+
+
+def test_load_twice_links_every_child_row(db_path):
+    chunks = [pd.Series(["first", "second", "third"]), pd.Series(["fourth", "fifth"])]
+    assert etl.load(iter(chunks)) == 5
+    assert etl.load(iter(chunks)) == 5
+
+    conn = sqlite3.connect(db_path)
+    for table in TABLES:
+        assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 10
+    for table in TABLES[1:]:
+        orphans = conn.execute(
+            f"SELECT COUNT(*) FROM {table} LEFT JOIN job ON job.id = {table}.job_id WHERE job.id IS NULL"
+        ).fetchone()[0]
+        assert orphans == 0
+        assert conn.execute(f"SELECT COUNT(DISTINCT job_id) FROM {table}").fetchone()[0] == 10
+    conn.close()
+
+
+def test_load_does_not_reuse_deleted_job_ids(db_path):
+    etl.load(iter([pd.Series(["first", "second"])]))
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("DELETE FROM job WHERE id = 2")
+
+    etl.load(iter([pd.Series(["third"])]))
+
+    assert conn.execute("SELECT id FROM job ORDER BY id").fetchall() == [(1,), (3,)]
+    assert conn.execute("SELECT job_id FROM company ORDER BY id").fetchall() == [(1,), (2,), (3,)]
+    conn.close()
+
+
+def test_finalize_keeps_indexes_and_statistics(db_path):
+    etl.load(iter([pd.Series(["first", "second"])]))
+
+    etl.finalize.function()
+
+    conn = sqlite3.connect(db_path)
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert set(etl.SECONDARY_INDEXES) <= indexes
+    analyzed = {row[0] for row in conn.execute("SELECT tbl FROM sqlite_stat1")}
+    assert set(TABLES[1:]) <= analyzed
+    conn.close()